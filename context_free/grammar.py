@@ -25,9 +25,15 @@ Notes
         3. The default dict implementation already preserves order.
 """
 import os
+import re
+import sys
 from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from heapq import heappop, heappush
+from itertools import chain
 
-from oset.ordered_set import OrderedSet
+from .ordered_set import OrderedSet
 
 from .parser import PredictiveParser
 
@@ -35,40 +41,82 @@ from .parser import PredictiveParser
 CFGS_DIR = os.path.join(os.path.dirname(__file__), '../cfgs')
 
 
+@lru_cache(maxsize=None)
+def cfg_path(filename: str) -> str:
+    """Path of a .cfg file inside cfgs/."""
+    return os.path.join(CFGS_DIR, filename)
+
+# validate_cfg_word's labels for the characters that aren't upper case or terminals
+_CFG_LABELS = {'\n': 'n', '|': 'b', '&': 'e', '❬': 'o', '❭': 'c', ' ': ''}
+
+# A token is either a brackets-variable or a single character
+_TOKEN_RE = re.compile(r"❬[^❭]+❭|.", re.DOTALL)
+
+# Trace left factoring steps; never enable it on the hot path, as it stringifies the grammar
+_DEBUG = False
+
+
 class Graph:
     def __init__(self, vertices, edges):
         self.vertices = vertices
         self.edges = edges
 
-    def bfs(self, s) -> list:
-        visited = {v:False for v in self.vertices}
-        visited[s] = True
+    def bfs(self, s) -> set:
+        """Return the set of vertices reachable from s, s included."""
+        visited = {s}
         q = deque()
         q.append(s)
         while len(q) > 0:
-            v = q.pop()
+            v = q.popleft()
             for u in self.edges[v]:
-                if not visited[u]:
-                    visited[u] = True
+                if u not in visited:
+                    visited.add(u)
                     q.append(u)
         return visited
 
     def has_loop(self, s) -> bool:
         """Test whether a vertex can reach itself."""
-        visited = {v:False for v in self.vertices}
-        visited[s] = True
+        visited = {s}
         q = deque()
         q.append(s)
         while len(q) > 0:
-            v = q.pop()
+            v = q.popleft()
             for u in self.edges[v]:
                 if u == s:
                     return True
-                if not visited[u]:
-                    visited[u] = True
+                if u not in visited:
+                    visited.add(u)
                     q.append(u)
         return False
 
+    def has_cycle(self) -> bool:
+        """Test whether some vertex can reach itself, with a single depth-first search.
+
+        Notes
+        -----
+            Vertices are colored 0 (not visited), 1 (in the current path) or 2 (done);
+            reaching a vertex in the current path closes a cycle.
+        """
+        color = dict.fromkeys(self.vertices, 0)
+        for root in self.vertices:
+            if color[root]:
+                continue
+            color[root] = 1
+            stack = [(root, iter(self.edges[root]))]
+            while stack:
+                v, successors = stack[-1]
+                for u in successors:
+                    if color[u] == 1:
+                        return True
+                    if color[u] == 0:
+                        color[u] = 1
+                        stack.append((u, iter(self.edges[u])))
+                        break
+                else:
+                    color[v] = 2
+                    stack.pop()
+        return False
+
 
 class ContextFreeGrammar:
     def __init__(self, filename: str):
@@ -94,102 +142,84 @@ class ContextFreeGrammar:
             you may run the unit tests.
         """
 
-        filepath = os.path.join(CFGS_DIR, filename)
+        filepath = cfg_path(filename)
         assert filepath[-4:] == '.cfg', "Invalid extension"
 
         self.variables = OrderedSet()
         self.terminals = OrderedSet()
         self.rules = dict()
         self.start = None
+        # Set while a chain of transformations runs, which is checked once at its end
+        self._batch = False
+        # Equal productions (and symbols) share one object, so that comparing them on a
+        # set lookup is an identity check
+        prods = dict()
 
-        with open(filepath, 'r') as f:
+        with open(filepath, 'r', encoding='utf-8') as f:
             file_read = f.read()
             ContextFreeGrammar.validate_cfg_word(file_read)
+            # NOTE: not splitlines, which also breaks on characters that may be terminals
             lines = file_read.split("\n")
+            assert len(lines[-1]) == 0
 
-            for line in lines:
-                if line == lines[-1]:
-                    assert len(line) == 0
+            for line in lines[:-1]:
+                if len(line) == 0:
                     continue
 
                 items = line.split()
-                var = items[0]
-                self.rules[var] = OrderedSet()
+                var = sys.intern(items[0])
                 self.variables.add(var)
 
                 # First iteration
                 if self.start is None:
                     self.start = var
 
-                k = 2
-                while k < len(items):
-                    raw = items[k]
-
-                    # NOTE: is not a method since the pre-conds are not worth testing
+                # items alternate between bodies and "|", after "var ->"
+                bodies = []
+                for raw in items[2::2]:
                     # Tokenize rule
                     tokenized = []
-                    i = 0
-                    while i < len(raw):
-                        c = raw[i]
-
-                        if c == '❬': # brackets-variable
-                            j = i + 1
-                            while raw[j] != '❭':
-                                j += 1
-
-                            assert len(raw[i:j+1]) > 3
-                            tokenized.append(raw[i:j+1])
-                            i = j + 1
-                        else: # uppercase-cariable or terminal
-                            tokenized.append(c)
-                            if c.isupper():
-                                pass
-                            else:
-                                if c != "&":
-                                    self.terminals.add(c)
-                            i += 1
-                    self.rules[var].add(tuple(tokenized))
-                    k += 2
-        self.CHECK_GRAMMAR()
+                    for token in _TOKEN_RE.findall(raw):
+                        if len(token) > 1: # brackets-variable
+                            assert len(token) > 3
+                        elif not token.isupper() and token != "&": # terminal
+                            self.terminals.add(token)
+                        tokenized.append(sys.intern(token))
+                    prod = tuple(tokenized)
+                    bodies.append(prods.setdefault(prod, prod))
+                self.rules[var] = OrderedSet(bodies)
+        if __debug__:
+            self.CHECK_GRAMMAR()
 
     def __str__(self) -> str: # CONST
-        string = ""
-
-        first = True
-        for rule in self.rules[self.start]:
-            if first:
-                string += "{} -> {} ".format(self.start, "".join(rule))
-                first = False
+        return "".join(self._iter_lines())
+
+    def _iter_lines(self): # CONST
+        """Yield the .cfg lines of the grammar, starting by the start symbol's."""
+        start = self.start
+        for var in chain((start,), (v for v in self.variables if v != start)):
+            bodies = " | ".join("".join(rule) for rule in self.rules[var])
+            if bodies:
+                yield "{} -> {}\n".format(var, bodies)
+            elif var == self.start:
+                yield "\n"
             else:
-                string += "| {} ".format("".join(rule))
-        string = string[:-1] + "\n"
-
-        for var in self.variables:
-            if var == self.start:
-                continue
-            first = True
-            string += "{} -> ".format(var)
-            for rule in self.rules[var]:
-                if first:
-                    string += "{} ".format("".join(rule))
-                    first = False
-                else:
-                    string += "| {} ".format("".join(rule))
-            string = string[:-1] + "\n"
-        return string
+                yield "{} ->\n".format(var)
 
     def save_to_file(self, filename: str): # CONST
-        filepath = os.path.join(CFGS_DIR, filename)
-        with open(filepath, 'w') as f:
-            f.write(str(self))
+        filepath = cfg_path(filename)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.writelines(self._iter_lines())
 
     def CHECK_GRAMMAR(self): # CONST
         """Temporary method for forcing structure into python."""
+        if self._batch:
+            return
         # Assert post-conditions: 2-6.
         assert type(self.variables) == OrderedSet and len(self.variables) > 0 \
-            and all([(v.isupper() and len(v) == 1) or (v[0] == '❬' and v[-1] == '❭' and len(v) > 2) for v in self.variables])
-        assert type(self.terminals) == OrderedSet and all([(t != '&') and (len(t) == 1) and not (t.isupper()) for t in self.terminals])
-        assert type(self.rules) == dict and self.rules.keys() == self.variables and all([type(val) == OrderedSet for val in self.rules.values()])
+            and all((v.isupper() and len(v) == 1) or (v[0] == '❬' and v[-1] == '❭' and len(v) > 2) for v in self.variables)
+        assert type(self.terminals) == OrderedSet and all((t != '&') and (len(t) == 1) and not (t.isupper()) for t in self.terminals)
+        assert type(self.rules) == dict and self.rules.keys() == self.variables and all(type(val) == OrderedSet for val in self.rules.values())
         assert self.start in self.variables
 
     @staticmethod
@@ -207,55 +237,106 @@ class ContextFreeGrammar:
             c: ❭
         """
         if VERIFY_GRAMMAR:
-            subst = [('\n', 'n'), ('|', 'b'), ('&', 'e'), ('->', 's'), ('❬', 'o'), ('❭', 'c')]
-            word2 = ''
-            i = 0
-            while i < len(word):
-                c = word[i]
-                if c.isupper():
-                    word2 += 'u'
-                elif c == '-' and word[i+1] == '>':
-                    word2 += '->'
-                    i += 1
-                elif c in {'\n', '|', '&', '❬', '❭'}:
-                    word2 += c
-                elif c == ' ':
-                    pass
-                else:
-                    word2 += 't'
-                i += 1
-            for k, v in subst:
-                word2 = word2.replace(k, v)
-            if not SPEC_PARSER.parse(word2):
+            # Label each distinct character once, then relabel the whole buffer through
+            # the table; arrows are split out first, as they span two characters
+            labels = {c: 'u' if c.isupper() else _CFG_LABELS.get(c, 't') for c in set(word)}
+            word2 = 's'.join(''.join(map(labels.__getitem__, part)) for part in word.split('->'))
+            if not get_spec_parser().parse(word2):
                 raise RuntimeError("This Grammar is not a valid .cfg file")
 
+    def _symbol_bits(self) -> dict: # CONST
+        """Map each symbol to its own bit, so that sets of symbols can be represented by ints.
+
+        Notes
+        -----
+            Union, intersection and inclusion become bitwise operations over python's
+            arbitrary-precision ints, which run in C instead of iterating over set elements.
+        """
+        bits = dict()
+        for sym in chain(("&", "$"), self.terminals, self.variables):
+            bits.setdefault(sym, 1 << len(bits))
+        # Bodies may mention variables without productions
+        for prods in self.rules.values():
+            for prod in prods:
+                for sym in prod:
+                    bits.setdefault(sym, 1 << len(bits))
+        return bits
+
+    def _derivable(self, ready) -> set: # CONST
+        """Close the `ready` symbols under: a variable is ready once one of its productions
+        is made of ready symbols only.
+
+        Notes
+        -----
+            Each production counts its distinct symbols that aren't ready yet, and is only
+            looked at again when one of those becomes ready (Hopcroft's algorithm).
+        """
+        ready = set(ready)
+        heads = []
+        missing = []
+        uses = dict()
+        queue = deque()
+        for head, prods in self.rules.items():
+            for prod in prods:
+                pending = set(prod) - ready
+                for sym in pending:
+                    uses.setdefault(sym, []).append(len(heads))
+                heads.append(head)
+                missing.append(len(pending))
+                if not pending and head not in ready:
+                    ready.add(head)
+                    queue.append(head)
+
+        while queue:
+            for k in uses.get(queue.popleft(), ()):
+                missing[k] -= 1
+                if missing[k] == 0 and heads[k] not in ready:
+                    ready.add(heads[k])
+                    queue.append(heads[k])
+        return ready
+
+    @staticmethod
+    def _bits_of(symbols, bits: dict) -> int:
+        """Bitwise representation of a collection of symbols."""
+        mask = 0
+        for sym in symbols:
+            mask |= bits[sym]
+        return mask
+
+    @staticmethod
+    def _first_body_bits(body, first_bits: dict, eps: int) -> int:
+        """Bitwise first_body, given the bitmasks of the firsts and of &."""
+        total = 0
+        for sym in body:
+            total |= first_bits[sym]
+            if not (first_bits[sym] & eps):
+                return total & ~eps
+        return total
+
+    def _var_graph(self, edge_symbols) -> Graph: # CONST
+        """Graph over the variables with an edge (A, B) for every variable B among
+        edge_symbols(body), for each production A => body.
+        """
+        var_set = set(self.variables)
+        edges = {var: [] for var in self.variables}
+        for head in self.variables:
+            for body in self.rules[head]:
+                for symbol in edge_symbols(body):
+                    if symbol in var_set:
+                        edges[head].append(symbol)
+        return Graph(self.variables, edges)
+
     def has_e(self): # CONST
         """Tests if the grammar has &-rules that are not in the start symbol."""
-        for v in self.variables:
-            for prod in self.rules[v]:
-                if v != self.start and prod == ("&",):
-                    return True
-        return False
+        start = self.start
+        return any(("&",) in prods for v, prods in self.rules.items() if v != start)
 
     def has_cycle(self): # CONST
         # (A, B) is an edge iff A => B is a rule
-        edges = {var: OrderedSet() for var in self.variables}
-        for head in self.variables:
-            for body in self.rules[head]:
-                if len(body) == 1 and body[0] in self.variables:
-                    edges[head].add(body[0])
-
-        graph = Graph(self.variables, edges)
+        graph = self._var_graph(lambda body: body if len(body) == 1 else ())
 
-        # Check if some V appears in B = > V, where B was visited by bfs(V)
-        for var in self.variables:
-            visited = graph.bfs(var)
-            for contender in self.variables:
-                if visited[contender]:
-                    for prod in self.rules[contender]:
-                        if prod == (var,):
-                            return True
-        return False
+        # V =>+ V iff V is in a cycle of unit productions
+        return graph.has_cycle()
 
     def remove_left_recursion(self): # NOT CONST
         """
@@ -278,38 +359,43 @@ class ContextFreeGrammar:
             raise RuntimeError("A grammar must be cycle-free in order to remove left recursions.")
 
         # Remove indirect
-        for i in range(len(self.variables)):
-            direct = False
-            for j in range(i):
-                to_remove = set()
-                for production in self.rules[self.variables[i]]:
-                    if self.variables[j] == production[0]:
+        # NOTE: new variables are appended to self.variables, so iterate over a snapshot
+        variables = list(self.variables)
+        for i, v_i in enumerate(variables):
+            prods_i = self.rules[v_i]
+            for v_j in variables[:i]:
+                # Most pairs don't substitute anything, so don't rebuild the rules for them
+                if not any(production[0] == v_j for production in prods_i):
+                    continue
+                new_prods_i = OrderedSet()
+                substituted = []
+                for production in prods_i:
+                    if production[0] == v_j:
                         alpha = production[1:]
-                        to_remove.add(production)
-                        for beta in self.rules[self.variables[j]]:
-                            self.rules[self.variables[i]].add(beta + alpha)
-
-                for rem in to_remove:
-                    self.rules[self.variables[i]].discard(rem)
+                        substituted.extend(beta + alpha for beta in self.rules[v_j])
+                    else:
+                        new_prods_i.add(production)
+                new_prods_i.update(substituted)
+                prods_i = new_prods_i
+            self.rules[v_i] = prods_i
 
-            for production in self.rules[self.variables[i]]:
-                if production[0] == self.variables[i]:
-                    direct = True
+            direct = any(production[0] == v_i for production in prods_i)
 
             if direct:
-                new_var = "❬{}'❭".format(self.variables[i])
+                new_var = "❬{}'❭".format(v_i)
                 self.variables.add(new_var)
                 self.rules[new_var] = OrderedSet()
                 new_prods_i = OrderedSet()
-                for production in self.rules[self.variables[i]]:
-                    if production[0] == self.variables[i]:
+                for production in self.rules[v_i]:
+                    if production[0] == v_i:
                         self.rules[new_var].add(production[1:]+(new_var, ))
                     else:
                         new_prods_i.add(production+(new_var, ))
 
-                self.rules[self.variables[i]] = new_prods_i
+                self.rules[v_i] = new_prods_i
                 self.rules[new_var].add(('&',))
-        self.CHECK_GRAMMAR()
+        if __debug__:
+            self.CHECK_GRAMMAR()
 
     def remove_unit(self): # NOT CONST
         """
@@ -323,81 +409,76 @@ class ContextFreeGrammar:
 
         Our algorithm takes care of cyclic productions
         """
-        def not_unit(production):
-            return len(production) > 1 or production[0] not in self.variables
+        var_set = set(self.variables)
 
-        # (A, B) is an edge iff A => B is a rule
-        edges = {var:OrderedSet() for var in self.variables}
-        for head in self.variables:
+        def not_unit(production):
+            return len(production) > 1 or production[0] not in var_set
+
+        # reach[i] has bit j set iff Ai =>* Aj through unit productions
+        # NOTE: Each variable reaches itself
+        variables = list(self.variables)
+        index = {var: i for i, var in enumerate(variables)}
+        reach = [1 << i for i in range(len(variables))]
+        for i, head in enumerate(variables):
             for body in self.rules[head]:
-                if len(body) == 1 and body[0] in self.variables:
-                    edges[head].add(body[0])
+                if len(body) == 1 and body[0] in var_set:
+                    reach[i] |= 1 << index[body[0]]
 
-        graph = Graph(self.variables, edges)
+        # Transitive closure (Warshall)
+        for k in range(len(variables)):
+            bit_k = 1 << k
+            for i in range(len(variables)):
+                if reach[i] & bit_k:
+                    reach[i] |= reach[k]
 
         # Expand all reacheable unit productions
-        # NOTE: Each variable visits itself in bfs
         new_rules = {var:OrderedSet() for var in self.variables}
-        for var in self.variables:
-            visited = graph.bfs(var)
-            for contender in self.variables:
-                if visited[contender]:
+        for i, var in enumerate(variables):
+            for j, contender in enumerate(variables):
+                if reach[i] >> j & 1:
                     for prod in self.rules[contender]:
                         if not_unit(prod):
                             new_rules[var].add(prod)
         self.rules = new_rules
-        self.CHECK_GRAMMAR()
+        if __debug__:
+            self.CHECK_GRAMMAR()
 
     def remove_epsilon(self): # NOT CONST
-        def power_set(i, cuts):
+        def power_set(prod):
             """Return the all possible cuts obtained by striking out a subset
-               of the nullable variables in the given production.
+               of the nullable symbols in the given production.
+
+               Bit k of a mask strikes out the k-th nullable symbol.
             """
-            if i == len(cuts[0]):
-                new_ps = OrderedSet()
-                for c in cuts:
-                    new_c = tuple()
-                    for c2 in c:
-                        if c2 != "ε":
-                            new_c += (c2,)
-                    if len(new_c) > 0:
-                        new_ps.add(new_c)
-                return new_ps
-
-            if cuts[0][i] in nullables:
-                to_add = OrderedSet()
-                for s in cuts:
-                    to_add.add(s[:i] + ("ε",) + s[i+1:])
-                cuts.update(to_add)
-            return power_set(i+1, cuts)
-
-        nullables = OrderedSet()
-        nullables.add("&")
-
-        # Find nullables through Hopcroft's algorithm
-        changed = True
-        while changed:
-            changed = False
-            for var, prods in self.rules.items():
-                for prod in prods:
-                    if all([p in nullables for p in prod]) and var not in nullables:
-                        nullables.add(var)
-                        changed = True
+            nullable_at = [i for i, sym in enumerate(prod) if bits[sym] & nullables]
+            if not nullable_at:
+                return (prod,)
+            cuts = OrderedSet()
+            for mask in range(1 << len(nullable_at)):
+                struck = {i for k, i in enumerate(nullable_at) if mask >> k & 1}
+                cut = tuple(sym for i, sym in enumerate(prod) if i not in struck)
+                if len(cut) > 0:
+                    cuts.add(cut)
+            return cuts
+
+        bits = self._symbol_bits()
+        nullables = ContextFreeGrammar._bits_of(self._derivable(("&",)), bits)
 
         # Strike out nullables
         for var in self.variables:
             to_add = OrderedSet()
             for prod in self.rules[var]:
-                to_add.update(power_set(0, OrderedSet([prod])))
+                to_add.update(power_set(prod))
             self.rules[var].update(to_add)
             if ("&", ) in self.rules[var]:
                 self.rules[var].discard(("&", ))
 
-        if self.start in nullables:
+        if bits[self.start] & nullables:
             self.variables.add("❬'{}❭".format(self.start))
             self.rules["❬'{}❭".format(self.start)] = OrderedSet([(self.start, ), ("&", )])
             self.start = "❬'{}❭".format(self.start)
-        self.CHECK_GRAMMAR()
+        if __debug__:
+            self.CHECK_GRAMMAR()
 
     def remove_unproductives(self): # NOT CONST
         """
@@ -407,38 +488,18 @@ class ContextFreeGrammar:
                 start_symbol -> start_symbol
             and it will keep its terminals.
         """
-        productives = OrderedSet()
-        for t in self.terminals:
-            productives.add(t)
-        productives.add("&")
-
-        changed = True
-        while changed:
-            changed = False
-            for var, prods in self.rules.items():
-                for prod in prods:
-                    if all([p in productives for p in prod]) and var not in productives:
-                        productives.add(var)
-                        changed = True
+        productives = self._derivable(chain(self.terminals, ("&",)))
 
+        # Keep the productive productions, and the variables left with some
         new_rules = dict()
         for v in self.variables:
-            new_production = OrderedSet()
-            for production in self.rules[v]:
-                if all([p in productives for p in production]):
-                    new_production.add(production)
-            new_rules[v] = new_production
+            new_production = OrderedSet(
+                production for production in self.rules[v] if productives.issuperset(production))
+            if len(new_production) > 0:
+                new_rules[v] = new_production
 
         self.rules = new_rules
-
-        to_remove = OrderedSet()
-        for v in self.variables:
-            if len(self.rules[v]) == 0:
-                to_remove.add(v)
-
-        for rem in to_remove:
-            del self.rules[rem]
-            self.variables.discard(rem)
+        self.variables = OrderedSet(new_rules)
 
         # if empty language S -> S
         if self.start not in self.rules.keys():
@@ -447,7 +508,8 @@ class ContextFreeGrammar:
             self.variables.add(self.start)
             self.rules[self.start] = OrderedSet()
             self.rules[self.start].add(self.start)
-        self.CHECK_GRAMMAR()
+        if __debug__:
+            self.CHECK_GRAMMAR()
 
     def remove_unreachables(self): # NOT CONST
         """
@@ -455,22 +517,14 @@ class ContextFreeGrammar:
         """
         # (A, B) is an edge iff A => alfa and B is in alfa
         # NOTE: doesn't take care of terminals
-        edges = {var:OrderedSet() for var in self.variables}
-        for head in self.variables:
-            for body in self.rules[head]:
-                for symbol in body:
-                    if symbol in self.variables:
-                        edges[head].add(symbol)
-
-        graph = Graph(self.variables, edges)
+        graph = self._var_graph(lambda body: body)
 
         # Remove both the variables that were not visited and their rules
-        new_rules = {var:OrderedSet() for var in self.variables}
         visited = graph.bfs(self.start)
-        for rem in OrderedSet( [v for v in self.variables if not visited[v]] ):
-            del self.rules[rem]
-            self.variables.discard(rem)
-        self.CHECK_GRAMMAR()
+        self.variables = OrderedSet(v for v in self.variables if v in visited)
+        self.rules = {v: prods for v, prods in self.rules.items() if v in visited}
+        if __debug__:
+            self.CHECK_GRAMMAR()
 
     def replace_terminals(self): # NOT CONST
         """
@@ -524,7 +578,8 @@ class ContextFreeGrammar:
         self.rules = new_rules
         for v in to_add_var:
             self.variables.add(v)
-        self.CHECK_GRAMMAR()
+        if __debug__:
+            self.CHECK_GRAMMAR()
 
     def reduce_size(self): # NOT CONST
         # reduce_size does not check if new_v was already in the grammar
@@ -560,26 +615,43 @@ class ContextFreeGrammar:
         self.rules = new_rules
         for v in to_add_var:
             self.variables.add(v)
-        self.CHECK_GRAMMAR()
+        if __debug__:
+            self.CHECK_GRAMMAR()
+
+    @contextmanager
+    def _batched(self):
+        """Skip CHECK_GRAMMAR inside the block; the grammar is checked once when it exits."""
+        self._batch = True
+        try:
+            yield
+        finally:
+            self._batch = False
+        if __debug__:
+            self.CHECK_GRAMMAR()
 
     def convert_to_cnf(self): # NOT CONST
-        self.remove_epsilon()
-        self.remove_unit()
-        self.remove_unproductives()
-        self.remove_unreachables()
-        self.replace_terminals()
-        self.reduce_size()
+        with self._batched():
+            self.remove_epsilon()
+            self.remove_unit()
+            self.remove_unproductives()
+            self.remove_unreachables()
+            self.replace_terminals()
+            self.reduce_size()
+
+    def _rhs_users(self) -> dict: # CONST
+        """Map each variable to the variables whose productions mention it."""
+        users = {v: set() for v in self.variables}
+        for head, prods in self.rules.items():
+            for prod in prods:
+                for sym in prod:
+                    if sym in users:
+                        users[sym].add(head)
+        return users
 
     def has_left_recursion(self): # CONST
         # (A, B) is an edge iff A => B𝛼 is a rule in rules
-        edges = {v:OrderedSet() for v in self.variables}
-        for v in self.variables:
-            for prod in self.rules[v]:
-                if prod[0] in self.variables:
-                    edges[v].add(prod[0])
-
-        graph = Graph(self.variables, edges)
-        return any([graph.has_loop(v) for v in self.variables])
+        graph = self._var_graph(lambda body: body[:1])
+        return graph.has_cycle()
 
     def firsts(self): # CONST
         """
@@ -614,25 +686,51 @@ class ContextFreeGrammar:
 
     def first_body(self, body, first=None): # CONST
         """Calculate the first of a syntactical form."""
-        lb = len(body)
         if first is None:
             first = self.firsts()
 
+        if len(body) == 1:
+            return first[body[0]].copy()
+
         total = OrderedSet()
-        for body in body:
-            to_add = first[body]
+        for sym in body:
+            to_add = first[sym]
             total.update(to_add)
             if "&" not in to_add:
                 total.discard("&")
                 break
         return total
 
-    def follows(self): # CONST
-        """Compute the follows."""
-        first = self.firsts()
+    def follows(self, first=None): # CONST
+        """Compute the follows; `first` may be given to reuse an already computed self.firsts().
+
+        Notes
+        -----
+            The fixed point is detected over a bitwise mirror of the follows (see
+            _symbol_bits), so the OrderedSets are only touched when they actually grow.
+        """
+        if first is None:
+            first = self.firsts()
+        var_set = set(self.variables)
+        bits = self._symbol_bits()
+        eps = bits["&"]
+        first_bits = {x: ContextFreeGrammar._bits_of(f, bits) for x, f in first.items()}
         follow = {v:OrderedSet() for v in self.variables}
+        follow_bits = {v:0 for v in self.variables}
+
+        # FIRST(body[i:]) for every suffix of every body, built right to left in a single pass
+        suffix_bits = dict()
+        for bodies in self.rules.values():
+            for body in bodies:
+                lb = len(body)
+                suffix = [0] * lb + [eps]
+                for i in range(lb-1, -1, -1):
+                    f = first_bits.get(body[i], 0)
+                    suffix[i] = (f & ~eps) | suffix[i+1] if f & eps else f
+                suffix_bits[body] = suffix
 
         follow[self.start].add("$")
+        follow_bits[self.start] = bits["$"]
         add = True
         while(add):
             add = False
@@ -640,22 +738,25 @@ class ContextFreeGrammar:
                 for body in bodies:
                     # Add FIRSTS
                     lb = len(body)
+                    suffix = suffix_bits[body]
                     for i in range(lb-1):
-                        if body[i] in self.variables:
-                            to_add = self.first_body(body[i+1:], first)
-                            to_add.discard("&")
-                            if not (to_add <= follow[body[i]]):
+                        if body[i] in var_set:
+                            to_add_bits = suffix[i+1] & ~eps
+                            if to_add_bits & ~follow_bits[body[i]]:
                                 add = True
+                                to_add = self.first_body(body[i+1:], first)
+                                to_add.discard("&")
                                 follow[body[i]].update(to_add)
+                                follow_bits[body[i]] |= to_add_bits
                     # Add FOLLOWS
-                    to_add = follow[head]
-                    to_add.discard("&")
+                    to_add_bits = follow_bits[head]
                     for i in range(lb-1, -1, -1):
-                        if body[i] in self.variables:
-                            if not to_add.issubset(follow[body[i]]):
+                        if body[i] in var_set:
+                            if to_add_bits & ~follow_bits[body[i]]:
                                 add = True
-                                follow[body[i]].update(to_add)
-                            if "&" not in first[body[i]]:
+                                follow[body[i]].update(follow[head])
+                                follow_bits[body[i]] |= to_add_bits
+                            if not (first_bits[body[i]] & eps):
                                 break
                         else:
                             break
@@ -670,7 +771,7 @@ class ContextFreeGrammar:
             2. The grammar has Fi/Fi or Fi/Fo conflict.
         """
         firsts = self.firsts()
-        follows = self.follows()
+        follows = self.follows(firsts)
         table = dict()
 
         for v in self.variables:
@@ -678,13 +779,13 @@ class ContextFreeGrammar:
                 first_alpha = self.first_body(alpha, firsts)
                 # If alpha = &, then skip the loop
                 for f in first_alpha - {'&'}:
-                    if (v, f) in table.keys():
+                    if (v, f) in table:
                         raise RuntimeError("First/First conflict at {}".format((v, f)))
                     else:
                         table[(v, f)] = alpha
                 if "&" in first_alpha:
                     for f in follows[v]:
-                        if (v, f) in table.keys():
+                        if (v, f) in table:
                             raise RuntimeError("First/Follow conflict at {}".format(v, f))
                         else:
                             table[(v, f)] = alpha
@@ -723,13 +824,14 @@ class ContextFreeGrammar:
                         to_add.add(prod_var+prod[1:])
                 return to_add
 
-            cached_first = self.firsts()
+            conflict_bit = bits[conflict_terminal]
             substitution_happened = True
             while substitution_happened:
                 substitution_happened = False
                 new_rules_v = OrderedSet()
                 for prod in self.rules[v]:
-                    if prod[0] in self.variables and conflict_terminal in self.first_body(prod, cached_first):
+                    if prod[0] in self.variables and \
+                            body_bits(prod) & conflict_bit:
                         new_rules_v.update(sub_var(prod))
                         substitution_happened = True
                     else:
@@ -755,99 +857,242 @@ class ContextFreeGrammar:
                 new_rules_old_v.add(lcp+(new_var,))
 
             # Add prods to factored variable
+            new_rules_new_var = OrderedSet()
             for prod in self.rules[v]:
                 if prod[0] == conflict_terminal:
-                    if len(prod[ll:]) != 0:
-                        self.rules[new_var].add(prod[ll:])
+                    if len(prod) > ll:
+                        new_rules_new_var.add(prod[ll:])
                     else:
-                        self.rules[new_var].add(("&",))
+                        new_rules_new_var.add(("&",))
                 else:
                     new_rules_old_v.add(prod)
 
+            self.rules[new_var] = new_rules_new_var
             self.rules[v] = new_rules_old_v
+            rules_changed(v)
+            rules_changed(new_var)
 
         def first_follow():
-            new_rules_old_v = OrderedSet()
-            to_discard = None
-            cached_firsts = self.firsts()
+            """Substitute the first nullable variable causing a Fi/Fo conflict in v's productions.
+
+            Returns
+            -------
+                True: some production was rewritten
+            """
             for prod in self.rules[v]:
                 lp = len(prod)
+                # suffix_first[i] = FIRST(Xi...Xn), built right to left
+                suffix_first = [0] * lp
+                suffix_first[lp-1] = first_bits[prod[lp-1]]
+                for j in range(lp-2, -1, -1):
+                    first_j = first_bits[prod[j]]
+                    if first_j & eps:
+                        suffix_first[j] = (first_j & ~eps) | suffix_first[j+1]
+                    else:
+                        suffix_first[j] = first_j
                 for i in range(lp-1):
                     # Test if any variable Xi appearing in X1X2...Xn has a Fi/Fo conflict
                     # That is, ε in FIRST(Xi) AND FIRST(Xi) ∩ FIRST(Xi+1...Xn) ≠ Ø
                     if prod[i] in self.variables:
-                        intersection = cached_firsts[prod[i]] & self.first_body(prod[i+1:], cached_firsts)
-                        intersection.discard("&")
-                        if "&" in cached_firsts[prod[i]] and len(intersection) != 0:
-                            to_discard = prod
+                        first_i = first_bits[prod[i]]
+                        if first_i & eps and first_i & suffix_first[i+1] & ~eps:
+                            new_rules_old_v = OrderedSet()
                             for prod_sub in self.rules[prod[i]]:
                                 if prod_sub == ("&", ):
                                     new_rules_old_v.add(prod[:i]+prod[i+1:])
                                 else:
                                     new_rules_old_v.add(prod[:i]+prod_sub+prod[i+1:])
-                            break
-                if not to_discard is None:
-                    break
-            self.rules[v].discard(to_discard)
-            self.rules[v].update(new_rules_old_v)
-            if not to_discard is None:
-                return True
+                            self.rules[v].discard(prod)
+                            self.rules[v].update(new_rules_old_v)
+                            rules_changed(v)
+                            return True
             return False
 
         def first_first():
             nonlocal conflict_terminal
-            cached_first = self.firsts()
             # Search for non determinism
-            total = OrderedSet()
+            total = 0
             for prod in self.rules[v]:
-                for ter in self.first_body(prod, cached_first):
-                    if ter in total and conflict_terminal is None:
-                        conflict_terminal = ter
-                        break
-                    total.add(ter)
+                first_prod = body_bits(prod)
+                if first_prod & total:
+                    # Only the first conflict is solved per call
+                    for ter in self.first_body(prod, cached_first):
+                        if bits[ter] & total:
+                            conflict_terminal = ter
+                            break
+                    break
+                total |= first_prod
 
             if conflict_terminal:
                 has_non_determinism = True
-                # print("\n\nGRAMMAR Before")
-                # print(self)
+                if _DEBUG:
+                    print("\n\nGRAMMAR Before")
+                    print(self)
 
                 # Expose indirect
                 expose_indirect_ndet(conflict_terminal)
-                # print("\n\nGRAMMAR After Substitutions")
-                # print(self)
+                if _DEBUG:
+                    print("\n\nGRAMMAR After Substitutions")
+                    print(self)
 
                 # Direct
                 lcp = os.path.commonprefix([prod for prod in self.rules[v] if prod[0] == conflict_terminal])
                 create_new_var_lcp(lcp)
-                # print("\n\nGRAMMAR After Eliminating Direct")
-                # print(self)
+                if _DEBUG:
+                    print("\n\nGRAMMAR After Eliminating Direct")
+                    print(self)
                 return True
             return False
 
-        for i in range(20):
+        def body_bits(prod):
+            """Bitwise FIRST(prod), memoized until the firsts change."""
+            first_prod = first_of_body.get(prod)
+            if first_prod is None:
+                first_prod = ContextFreeGrammar._first_body_bits(prod, first_bits, eps)
+                first_of_body[prod] = first_prod
+            return first_prod
+
+        def recheck(var):
+            """Queue var, in this sweep if it hasn't been reached yet, otherwise in the next one."""
+            # New variables get the next free position, after current, so they are checked
+            # in the same sweep, as they were when the sweeps walked self.variables
+            if var not in position:
+                position[var] = len(order)
+                order.append(var)
+            i = position[var]
+            if i <= current:
+                next_sweep.add(i)
+            elif i not in queued:
+                queued.add(i)
+                heappush(worklist, i)
+
+        def rules_changed(var):
+            """Check var again, and register it as a user of the variables it now mentions."""
+            # Must be called after every rewrite of self.rules[var], or var could stay marked
+            # clean while holding a conflict
+            recheck(var)
+            for prod in self.rules[var]:
+                for sym in prod:
+                    if sym in self.variables:
+                        users.setdefault(sym, set()).add(var)
+
+        def refresh_firsts():
+            """Recompute the firsts; the users of a variable whose FIRST changed are checked again."""
+            # Only the contents of the FIRST sets decide whether a variable has a conflict, so the
+            # bitmasks are compared; a reordered FIRST set doesn't make any variable dirty
+            nonlocal cached_first, first_bits
+            cached_first = self.firsts()
+            new_bits = {x: ContextFreeGrammar._bits_of(f, bits) for x, f in cached_first.items()}
+            for x, f in first_bits.items():
+                if new_bits[x] != f:
+                    first_of_body.clear()
+                    for u in users.get(x, ()):
+                        recheck(u)
+            first_bits = new_bits
+
+        # Invariant: apart from the v being checked, every variable that is in neither worklist
+        # nor next_sweep is clean, i.e. first_follow and first_first found no conflict in it.
+        # Conflicts only depend on a variable's own rules and on the contents of the FIRST sets
+        # of the symbols they mention, so a clean variable stays clean unless its rules or one of
+        # those FIRST sets change; rules_changed and refresh_firsts queue it again in exactly
+        # those cases. Skipping clean variables thus finds the same conflicts as a full sweep.
+        # NOTE: The worklist is ordered by position in self.variables, as the old sweeps were:
+        #       which conflict is solved first decides the names of the new variables.
+        #       users may keep stale entries, which only cost an extra check
+        users = self._rhs_users()
+        order = list(self.variables)
+        position = {var: i for i, var in enumerate(order)}
+        worklist = list(range(len(order)))
+        queued = set(worklist)
+        next_sweep = set()
+        current = -1
+        cached_first = self.firsts()
+        # Bitwise copy of the firsts for the set algebra (see _symbol_bits)
+        bits = self._symbol_bits()
+        eps = bits["&"]
+        first_bits = {x: ContextFreeGrammar._bits_of(f, bits) for x, f in cached_first.items()}
+        first_of_body = dict()
+        # Each step factors one conflict; grammars that aren't LL(1) may never run out of them,
+        # and on those every step can multiply the productions. Past the first 20 steps the loop
+        # only goes on while the grammar stays within a budget relative to its input size.
+        # NOTE: The constant leaves room for small grammars, which may need several times their
+        #       size to converge
+        max_steps = max(64, 4 * len(self.variables))
+        max_prods = 4 * sum(len(prods) for prods in self.rules.values()) + 256
+        steps = 0
+        has_non_determinism = True
+        while has_non_determinism and steps < max_steps:
+            if steps >= 20 and sum(len(prods) for prods in self.rules.values()) > max_prods:
+                break
             has_non_determinism = False
-
-            for v in self.variables:
+            for i in next_sweep - queued:
+                queued.add(i)
+                heappush(worklist, i)
+            next_sweep.clear()
+            current = -1
+            # NOTE: Only recomputed when the rules change, as the order of the firsts
+            #       decides which conflict is solved first
+            if steps > 0:
+                refresh_firsts()
+            steps += 1
+
+            while worklist:
+                current = heappop(worklist)
+                queued.discard(current)
+                v = order[current]
                 conflict_terminal = None
 
                 # Fi/Fo conflict always introduces Fi/Fi conflict
                 fi_fo = first_follow()
+                if fi_fo:
+                    refresh_firsts()
 
-                # Start another iteration of non-determinism remains
-                fi_fi = first_first()
-                if fi_fi:
+                # Start another sweep if non-determinism remains
+                if first_first():
                     has_non_determinism = True
                     break
 
-            if not has_non_determinism:
-                # print("Finished in {} step(s)".format(i))
-                self.CHECK_GRAMMAR()
-                return True
-        self.CHECK_GRAMMAR()
-        return False
+        if __debug__:
+            self.CHECK_GRAMMAR()
+        if has_non_determinism:
+            if _DEBUG:
+                print("Gave up after {} step(s)".format(steps))
+            return False
+        if _DEBUG:
+            print("Finished in {} step(s)".format(steps))
+        return True
 
-VERIFY_GRAMMAR = False
-SPEC_GRAMMAR = ContextFreeGrammar("spec.cfg")
-SPEC_PARSER = SPEC_GRAMMAR.make_LL1_parser()
-# print(SPEC_PARSER)
 VERIFY_GRAMMAR = True
+_SPEC_GRAMMAR = None
+_SPEC_PARSER = None
+
+
+def get_spec_grammar() -> ContextFreeGrammar:
+    """Grammar of the .cfg format (spec.cfg), built on first use."""
+    global _SPEC_GRAMMAR, VERIFY_GRAMMAR
+    if _SPEC_GRAMMAR is None:
+        # spec.cfg can't be verified against itself, so it is assumed to be valid
+        verify = VERIFY_GRAMMAR
+        VERIFY_GRAMMAR = False
+        try:
+            _SPEC_GRAMMAR = ContextFreeGrammar("spec.cfg")
+        finally:
+            VERIFY_GRAMMAR = verify
+    return _SPEC_GRAMMAR
+
+
+def get_spec_parser() -> PredictiveParser:
+    """LL(1) parser of the .cfg format, built on first use."""
+    global _SPEC_PARSER
+    if _SPEC_PARSER is None:
+        _SPEC_PARSER = get_spec_grammar().make_LL1_parser()
+    return _SPEC_PARSER
+
+
+def __getattr__(name):
+    """Keep SPEC_GRAMMAR and SPEC_PARSER available without building them at import time."""
+    if name == "SPEC_GRAMMAR":
+        return get_spec_grammar()
+    if name == "SPEC_PARSER":
+        return get_spec_parser()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
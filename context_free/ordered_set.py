@@ -0,0 +1,79 @@
+"""This module provides an insertion-ordered set built on top of python's dict.
+
+Since python 3.7 dicts preserve insertion order, so a dict whose values are all None behaves
+as an ordered set whose membership test, insertion, removal and iteration are implemented in C.
+
+Notes
+-----
+    Only the subset of the oset.OrderedSet interface used by this library is provided.
+    Indexing (oset[i]) is O(n), as dicts have no positional access; it is meant for the
+    rare callers that need the first element. The methods inherited from dict and not
+    overridden here (pop, values, items, ...) keep their dict meaning.
+"""
+from collections.abc import Sequence
+
+
+class OrderedSet(dict):
+    __slots__ = ()
+
+    def __init__(self, iterable=()):
+        super().__init__(dict.fromkeys(iterable))
+
+    def add(self, key):
+        self[key] = None
+
+    def discard(self, key):
+        self.pop(key, None)
+
+    def update(self, iterable):
+        super().update(dict.fromkeys(iterable))
+
+    def copy(self) -> "OrderedSet":
+        return OrderedSet(self)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return OrderedSet(list(self)[index])
+        return list(self)[index]
+
+    def __repr__(self) -> str:
+        if not self:
+            return "OrderedSet()"
+        return "OrderedSet({!r})".format(list(self))
+
+    def __eq__(self, other) -> bool:
+        """Order is only taken into account if `other` is ordered too."""
+        if isinstance(other, (OrderedSet, Sequence)):
+            return list(self) == list(other)
+        try:
+            return set(self) == set(other)
+        except TypeError:
+            return False
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    def __or__(self, other) -> "OrderedSet":
+        union = OrderedSet(self)
+        union.update(other)
+        return union
+
+    def __ror__(self, other) -> "OrderedSet":
+        union = OrderedSet(other)
+        union.update(self)
+        return union
+
+    def __ior__(self, other) -> "OrderedSet":
+        self.update(other)
+        return self
+
+    def __and__(self, other) -> "OrderedSet":
+        return OrderedSet(key for key in self if key in other)
+
+    def __sub__(self, other) -> "OrderedSet":
+        return OrderedSet(key for key in self if key not in other)
+
+    def __le__(self, other) -> bool:
+        return all(key in other for key in self)
+
+    issubset = __le__
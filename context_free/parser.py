@@ -1,5 +1,5 @@
 """This module provides parsers implementations. """
-from oset.ordered_set import OrderedSet
+from itertools import chain
 
 
 class PredictiveParser:
@@ -10,10 +10,23 @@ class PredictiveParser:
             1. table is a valid LL(1) table. That is, it has no conflicts and it's
                not left recursive.
         """
-        self.variables = OrderedSet([e[0] for e in table.keys()])
-        self.terminals = OrderedSet([e[1] for e in table.keys()]) # Contains $
+        # Ordered and without repetitions; parse only needs them through _ids
+        self.variables = tuple(dict.fromkeys(e[0] for e in table))
+        self.terminals = tuple(dict.fromkeys(e[1] for e in table)) # Contains $
         self.table = table
 
+        # parse runs over ints: variables are numbered first, so that an id below
+        # len(self.variables) is a variable, and _actions[var][term] holds the reversed
+        # body to push (None if there is no action)
+        self._ids = {v: i for i, v in enumerate(self.variables)}
+        for sym in chain("$", self.terminals, chain.from_iterable(table.values())):
+            if sym != "&":
+                self._ids.setdefault(sym, len(self._ids))
+        self._actions = [[None] * len(self._ids) for _ in self.variables]
+        for (v, t), body in table.items():
+            rev = () if body == ("&",) else tuple(self._ids[c] for c in reversed(body))
+            self._actions[self._ids[v]][self._ids[t]] = rev
+
     def __str__(self):
         """Nicely formatted transition table."""
         def format_string(raw):
@@ -25,24 +38,23 @@ class PredictiveParser:
         columns = 1 + len(self.terminals)
         # there are columns+1 vertical separators (|)
         row_size = col_size * columns + columns + 1
-        string = "=" * row_size
-        string += "\n|{}|".format(format_string("Var \ Term"))
+        # Formatted cells, one per action
+        cells = {key: format_string(''.join(body)) for key, body in self.table.items()}
+        missing = format_string("None")
 
+        parts = ["=" * row_size, "\n|{}|".format(format_string("Var \ Term"))]
         for t in self.terminals:
-            string += "{}|".format(format_string(t))
+            parts.append("{}|".format(format_string(t)))
 
         for v in self.variables:
             # horizontal separator (-----)
-            string += "\n|{}|".format("-" * (row_size - 2))
-            string += "\n|{}|".format(format_string(v))
+            parts.append("\n|{}|".format("-" * (row_size - 2)))
+            parts.append("\n|{}|".format(format_string(v)))
 
             for t in self.terminals:
-                try:
-                    string += "{}|".format(format_string(''.join(self.table[(v, t)])))
-                except KeyError:
-                    string += "{}|".format(format_string("None"))
-        string += "\n{}".format("=" * row_size)
-        return string
+                parts.append("{}|".format(cells.get((v, t), missing)))
+        parts.append("\n{}".format("=" * row_size))
+        return "".join(parts)
 
 
     def parse(self, string: str) -> bool:
@@ -51,16 +63,19 @@ class PredictiveParser:
         --------------
             1. string consists only of terminals.
         """
-        string += "$"
-        start = self.variables[0] # NOTE: variables is ordered
-        stack = ["$", start]
+        ids, actions = self._ids, self._actions
+        end = ids["$"]
+        nvars = len(self.variables)
+        # Characters that aren't symbols of the table become None, and match nothing
+        tokens = list(map(ids.get, string))
+        tokens.append(end)
+        stack = [end, 0] # NOTE: variables is ordered, the start symbol is numbered 0
         i = 0
-        while i < len(string):
-            s = string[i]
-            # print("S={}, STACK={}".format(s, stack))
-            if stack[-1] == s:
-                # print("SHIFTING INPUT")
-                if s == "$":
+        while i < len(tokens):
+            s = tokens[i]
+            top = stack[-1]
+            if top == s:
+                if s == end:
                     assert len(stack) == 1
                     return True
                 else:
@@ -68,13 +83,10 @@ class PredictiveParser:
                     i += 1
                     continue
             else: # expand variable
-                state = (stack[-1], s)
-                # print("EXPANDING STACK")
-                if state not in self.table.keys(): # No action from this state
+                if top >= nvars or s is None: # No action from this state
                     return False
-                else:
-                    action = self.table[(stack[-1], s)]
-                    stack.pop()
-                    if action != ("&",):
-                        for c in reversed(action):
-                            stack.append(c)
+                action = actions[top][s]
+                if action is None:
+                    return False
+                stack.pop()
+                stack.extend(action)
@@ -2,3 +2,4 @@
 import unittest
 
 from .test_grammar import TestContextFreeGrammar
+from .test_ordered_set import TestOrderedSet
@@ -0,0 +1,93 @@
+"""OrderedSet unit tests."""
+import pickle
+import unittest
+
+from context_free.ordered_set import OrderedSet
+
+
+class TestOrderedSet(unittest.TestCase):
+
+    def test_order(self):
+        oset = OrderedSet('abracadabra')
+        self.assertEqual(len(oset), 5)
+        self.assertEqual(list(oset), ['a', 'b', 'r', 'c', 'd'])
+        self.assertEqual(repr(oset), "OrderedSet(['a', 'b', 'r', 'c', 'd'])")
+        self.assertEqual(repr(OrderedSet()), "OrderedSet()")
+
+    def test_eq(self):
+        oset = OrderedSet(['a', 'b', 'c'])
+        # Order is taken into account against other OrderedSets and sequences...
+        self.assertEqual(oset, OrderedSet(['a', 'b', 'c']))
+        self.assertNotEqual(oset, OrderedSet(['c', 'b', 'a']))
+        self.assertEqual(oset, ['a', 'b', 'c'])
+        self.assertEqual(oset, ('a', 'b', 'c'))
+        self.assertNotEqual(oset, ['c', 'b', 'a'])
+        self.assertNotEqual(oset, ['a', 'b'])
+        # ...but not against sets
+        self.assertEqual(oset, {'c', 'b', 'a'})
+        self.assertEqual(oset, frozenset('abc'))
+        self.assertNotEqual(oset, {'a', 'b'})
+        self.assertNotEqual(oset, 1)
+        self.assertFalse(oset != OrderedSet(['a', 'b', 'c']))
+
+    def test_add_discard_update(self):
+        oset = OrderedSet(['a', 'b', 'c'])
+        oset.add('b')
+        self.assertEqual(oset, ['a', 'b', 'c'])
+        oset.discard('b')
+        oset.discard('x')
+        self.assertEqual(oset, ['a', 'c'])
+        oset.add('b')
+        self.assertEqual(oset, ['a', 'c', 'b'])
+        oset.update(['d', 'a', 'e'])
+        self.assertEqual(oset, ['a', 'c', 'b', 'd', 'e'])
+        self.assertIn('d', oset)
+        self.assertNotIn('x', oset)
+
+    def test_set_operators(self):
+        oset1 = OrderedSet('abracadabra')
+        oset2 = OrderedSet('simsalabim')
+        self.assertEqual(oset1 | oset2, ['a', 'b', 'r', 'c', 'd', 's', 'i', 'm', 'l'])
+        self.assertEqual(oset1 & oset2, ['a', 'b'])
+        self.assertEqual(oset1 - oset2, ['r', 'c', 'd'])
+        self.assertEqual(oset1 | {'z'}, ['a', 'b', 'r', 'c', 'd', 'z'])
+        self.assertEqual(['z', 'a'] | oset1, ['z', 'a', 'b', 'r', 'c', 'd'])
+        for result in (oset1 | oset2, oset1 & oset2, oset1 - oset2, ['z'] | oset1):
+            self.assertIs(type(result), OrderedSet)
+
+        union = oset1
+        union |= ['z', 'a']
+        self.assertIs(union, oset1)
+        self.assertEqual(oset1, ['a', 'b', 'r', 'c', 'd', 'z'])
+
+    def test_subset(self):
+        oset = OrderedSet(['a', 'b'])
+        self.assertTrue(oset <= OrderedSet(['b', 'c', 'a']))
+        self.assertTrue(oset.issubset({'a', 'b'}))
+        self.assertFalse(oset <= ['a'])
+        self.assertTrue(OrderedSet() <= oset)
+
+    def test_getitem(self):
+        oset = OrderedSet(['a', 'b', 'c'])
+        self.assertEqual(oset[0], 'a')
+        self.assertEqual(oset[-1], 'c')
+        self.assertEqual(oset[1:], OrderedSet(['b', 'c']))
+        self.assertIs(type(oset[1:]), OrderedSet)
+        with self.assertRaises(IndexError):
+            oset[3]
+
+    def test_copy(self):
+        oset = OrderedSet(['a', 'b'])
+        copy = oset.copy()
+        self.assertIs(type(copy), OrderedSet)
+        self.assertEqual(copy, oset)
+        copy.add('c')
+        self.assertEqual(oset, ['a', 'b'])
+
+    def test_pickle(self):
+        for oset in (OrderedSet('abracadabra'), OrderedSet(), OrderedSet([('S', 'a'), ('&',)])):
+            roundtrip = pickle.loads(pickle.dumps(oset))
+            self.assertIs(type(roundtrip), OrderedSet)
+            self.assertEqual(roundtrip, oset)
+        nested = {'S': OrderedSet([('a', 'S'), ('&',)])}
+        self.assertEqual(pickle.loads(pickle.dumps(nested)), nested)